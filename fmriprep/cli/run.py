@@ -146,7 +146,7 @@ Important to note, the ``res-*`` modifier does not define the resolution used fo
 the spatial normalization.
 For further details, please check out \
 https://fmriprep.readthedocs.io/en/%s/spaces.html""" % (
-            ', '.join('"%s"' % s for s in templates()), ', '.join(NONSTANDARD_REFERENCES),
+            ', '.join('"%s"' % s for s in templates()), ', '.join(sorted(NONSTANDARD_REFERENCES)),
             currentv.base_version if is_release else 'latest'))
 
     g_conf.add_argument(
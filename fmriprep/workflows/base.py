@@ -13,25 +13,24 @@ fMRIprep base processing workflows
 
 import sys
 import os
-from collections import OrderedDict
+from collections import namedtuple
 from copy import deepcopy
 
-from nipype import __version__ as nipype_ver
-from nipype.pipeline import engine as pe
-from nipype.interfaces import utility as niu
-from niworkflows.interfaces.nilearn import NILEARN_VERSION
+from ..__about__ import __version__
 
-from niworkflows.engine.workflows import LiterateWorkflow as Workflow
-from niworkflows.interfaces.bids import (
-    BIDSInfo, BIDSDataGrabber, BIDSFreeSurferDir
-)
-from niworkflows.utils.bids import collect_data
-from niworkflows.utils.misc import fix_multi_T1w_source_name
-from smriprep.workflows.anatomical import init_anat_preproc_wf
+# nipype, niworkflows and smriprep are imported within the workflow
+# factories - pulling them in at module load would make importing this
+# module (e.g., for the CLI or the documentation) pay the full cost of
+# the workflow machinery
 
-from ..interfaces import SubjectSummary, AboutSummary, DerivativesDataSink
-from ..__about__ import __version__
-from .bold import init_func_preproc_wf
+# Stand-in for a BIDSLayout that can cross process boundaries - workers
+# reload the full layout from the cached index (see init_single_subject_wf)
+_BIDSLayoutStub = namedtuple('_BIDSLayoutStub', ('root',))
+
+# Fixed-slot holder for the input files of one subject - lighter than a
+# per-subject dict, and attribute access guards against typos
+SubjectData = namedtuple(
+    'SubjectData', ('fmap', 'bold', 'sbref', 'flair', 't2w', 't1w', 'roi'))
 
 
 def init_fmriprep_wf(
@@ -82,7 +81,7 @@ def init_fmriprep_wf(
         :simple_form: yes
 
         import os
-        from collections import namedtuple, OrderedDict
+        from collections import namedtuple
         BIDSLayout = namedtuple('BIDSLayout', ['root'])
         from fmriprep.workflows.base import init_fmriprep_wf
         os.environ['FREESURFER_HOME'] = os.getcwd()
@@ -107,9 +106,9 @@ def init_fmriprep_wf(
             medial_surface_nan=False,
             omp_nthreads=1,
             output_dir='.',
-            output_spaces=OrderedDict([
-                ('MNI152Lin', {}), ('fsaverage', {'density': '10k'}),
-                ('T1w', {}), ('fsnative', {})]),
+            output_spaces={
+                'MNI152Lin': {}, 'fsaverage': {'density': '10k'},
+                'T1w': {}, 'fsnative': {}},
             regressors_all_comps=False,
             regressors_dvars_th=1.5,
             regressors_fd_th=0.5,
@@ -168,8 +167,8 @@ def init_fmriprep_wf(
             Maximum number of threads an individual process may use
         output_dir : str
             Directory in which to save derivatives
-        output_spaces : OrderedDict
-            Ordered dictionary where keys are TemplateFlow ID strings (e.g., ``MNI152Lin``,
+        output_spaces : dict
+            Dictionary (order matters) where keys are TemplateFlow ID strings (e.g., ``MNI152Lin``,
             ``MNI152NLin6Asym``, ``MNI152NLin2009cAsym``, or ``fsLR``) strings designating
             nonstandard references (e.g., ``T1w`` or ``anat``, ``sbref``, ``run``, etc.),
             or paths pointing to custom templates organized in a TemplateFlow-like structure.
@@ -208,62 +207,129 @@ def init_fmriprep_wf(
             Directory in which to store workflow execution state and temporary files
 
     """
+    from nipype.pipeline import engine as pe
+    from niworkflows.engine.workflows import LiterateWorkflow as Workflow
+    from niworkflows.interfaces.bids import BIDSFreeSurferDir
+
+    from ..config import DEFAULT_MEMORY_MIN_GB, NONSTANDARD_REFERENCES
+
     fmriprep_wf = Workflow(name='fmriprep_wf')
     fmriprep_wf.base_dir = work_dir
 
+    # Index the dataset only once, and share the SQLite database across
+    # subjects (the stand-in layouts used when building the documentation
+    # do not implement ``save``).
+    bids_database_file = None
+    if hasattr(layout, 'save'):
+        bids_database_file = os.path.join(work_dir, 'bids_db.sqlite')
+        # pybids replays a full SQL dump into the target database, which
+        # fails if tables are left over from a previous run in a reused
+        # working directory
+        if os.path.exists(bids_database_file):
+            os.unlink(bids_database_file)
+        layout.save(bids_database_file)
+
+    # Filter output_spaces for the surface references only once; every
+    # FreeSurfer-dependent consumer can draw from these
+    fsaverage_spaces = []
+    fsnative_requested = False
+    for space in output_spaces:
+        if space.startswith('fsaverage'):
+            fsaverage_spaces.append(space)
+        elif space == 'fsnative':
+            fsnative_requested = True
+
     if freesurfer:
+        # fsnative always trails the fsaverage entries
+        fsdir_spaces = list(fsaverage_spaces)
+        if fsnative_requested:
+            fsdir_spaces.append('fsnative')
+
         fsdir = pe.Node(
             BIDSFreeSurferDir(
                 derivatives=output_dir,
                 freesurfer_home=os.getenv('FREESURFER_HOME'),
-                spaces=[s for s in output_spaces.keys() if s.startswith('fsaverage')] + [
-                    'fsnative'] * ('fsnative' in output_spaces)),
-            name='fsdir_run_' + run_uuid.replace('-', '_'), run_without_submitting=True)
+                spaces=fsdir_spaces),
+            name='fsdir_run_' + run_uuid.replace('-', '_'),
+            mem_gb=DEFAULT_MEMORY_MIN_GB, run_without_submitting=True)
 
     reportlets_dir = os.path.join(work_dir, 'reportlets')
-    for subject_id in subject_list:
-        single_subject_wf = init_single_subject_wf(
-            anat_only=anat_only,
-            aroma_melodic_dim=aroma_melodic_dim,
-            bold2t1w_dof=bold2t1w_dof,
-            cifti_output=cifti_output,
-            debug=debug,
-            dummy_scans=dummy_scans,
-            echo_idx=echo_idx,
-            err_on_aroma_warn=err_on_aroma_warn,
-            fmap_bspline=fmap_bspline,
-            fmap_demean=fmap_demean,
-            force_syn=force_syn,
-            freesurfer=freesurfer,
-            hires=hires,
-            ignore=ignore,
-            layout=layout,
-            longitudinal=longitudinal,
-            low_mem=low_mem,
-            medial_surface_nan=medial_surface_nan,
-            name="single_subject_" + subject_id + "_wf",
-            omp_nthreads=omp_nthreads,
-            output_dir=output_dir,
-            output_spaces=output_spaces,
-            regressors_all_comps=regressors_all_comps,
-            regressors_dvars_th=regressors_dvars_th,
-            regressors_fd_th=regressors_fd_th,
-            reportlets_dir=reportlets_dir,
-            skull_strip_fixed_seed=skull_strip_fixed_seed,
-            skull_strip_template=skull_strip_template,
-            subject_id=subject_id,
-            t2s_coreg=t2s_coreg,
-            task_id=task_id,
-            use_aroma=use_aroma,
-            use_bbr=use_bbr,
-            use_syn=use_syn,
-        )
 
-        single_subject_wf.config['execution']['crashdump_dir'] = (
-            os.path.join(output_dir, "fmriprep", "sub-" + subject_id, 'log', run_uuid)
-        )
-        for node in single_subject_wf._get_all_nodes():
-            node.config = deepcopy(single_subject_wf.config)
+    # Gather the inputs of the whole cohort with one layout query, instead
+    # of several queries per subject inside collect_data (the stand-in
+    # layouts used when building the documentation cannot be queried).
+    subjects_data = {subject_id: None for subject_id in subject_list}
+    if hasattr(layout, 'get'):
+        subjects_data = _collect_all_data(layout, subject_list, task_id, echo_idx)
+
+    # The requested nonstandard spaces only depend on output_spaces -
+    # compute them here rather than once per subject
+    nstd_spaces = sorted(NONSTANDARD_REFERENCES & output_spaces.keys())
+
+    # Arguments that do not vary across subjects are bound only once
+    base_kwargs = dict(
+        anat_only=anat_only,
+        aroma_melodic_dim=aroma_melodic_dim,
+        bids_database_file=bids_database_file,
+        bold2t1w_dof=bold2t1w_dof,
+        cifti_output=cifti_output,
+        debug=debug,
+        dummy_scans=dummy_scans,
+        echo_idx=echo_idx,
+        err_on_aroma_warn=err_on_aroma_warn,
+        fmap_bspline=fmap_bspline,
+        fmap_demean=fmap_demean,
+        force_syn=force_syn,
+        freesurfer=freesurfer,
+        hires=hires,
+        ignore=ignore,
+        layout=layout,
+        longitudinal=longitudinal,
+        low_mem=low_mem,
+        medial_surface_nan=medial_surface_nan,
+        nstd_spaces=nstd_spaces,
+        omp_nthreads=omp_nthreads,
+        output_dir=output_dir,
+        output_spaces=output_spaces,
+        regressors_all_comps=regressors_all_comps,
+        regressors_dvars_th=regressors_dvars_th,
+        regressors_fd_th=regressors_fd_th,
+        reportlets_dir=reportlets_dir,
+        skull_strip_fixed_seed=skull_strip_fixed_seed,
+        skull_strip_template=skull_strip_template,
+        t2s_coreg=t2s_coreg,
+        task_id=task_id,
+        use_aroma=use_aroma,
+        use_bbr=use_bbr,
+        use_syn=use_syn,
+    )
+    subject_kwargs = [dict(
+        crashdump_dir=os.path.join(
+            output_dir, "fmriprep", "sub-" + subject_id, 'log', run_uuid),
+        name="single_subject_" + subject_id + "_wf",
+        subject_data=subjects_data[subject_id],
+        subject_id=subject_id,
+        **base_kwargs) for subject_id in subject_list]
+
+    if omp_nthreads > 1 and len(subject_list) > 1 and bids_database_file is not None:
+        # Workflow construction is compute-bound, pure-Python work, and every
+        # subject is independent - build the sub-workflows concurrently.
+        # The SQLAlchemy-backed BIDSLayout does not survive pickling, so
+        # workers receive a lightweight stand-in and reload the layout from
+        # the cached index instead.
+        from concurrent.futures import ProcessPoolExecutor
+        layout_stub = _BIDSLayoutStub(root=layout.root)
+        for kwargs in subject_kwargs:
+            kwargs['layout'] = layout_stub
+        with ProcessPoolExecutor(max_workers=omp_nthreads) as pool:
+            futures = [pool.submit(init_single_subject_wf, **kwargs)
+                       for kwargs in subject_kwargs]
+            single_subject_wfs = [future.result() for future in futures]
+    else:
+        single_subject_wfs = [init_single_subject_wf(**kwargs)
+                              for kwargs in subject_kwargs]
+
+    for single_subject_wf in single_subject_wfs:
         if freesurfer:
             fmriprep_wf.connect(fsdir, 'subjects_dir',
                                 single_subject_wf, 'inputnode.subjects_dir')
@@ -276,8 +342,10 @@ def init_fmriprep_wf(
 def init_single_subject_wf(
     anat_only,
     aroma_melodic_dim,
+    bids_database_file,
     bold2t1w_dof,
     cifti_output,
+    crashdump_dir,
     debug,
     dummy_scans,
     echo_idx,
@@ -293,6 +361,7 @@ def init_single_subject_wf(
     low_mem,
     medial_surface_nan,
     name,
+    nstd_spaces,
     omp_nthreads,
     output_dir,
     output_spaces,
@@ -302,6 +371,7 @@ def init_single_subject_wf(
     regressors_fd_th,
     skull_strip_fixed_seed,
     skull_strip_template,
+    subject_data,
     subject_id,
     t2s_coreg,
     task_id,
@@ -324,13 +394,15 @@ def init_single_subject_wf(
         :simple_form: yes
 
         from fmriprep.workflows.base import init_single_subject_wf
-        from collections import namedtuple, OrderedDict
+        from collections import namedtuple
         BIDSLayout = namedtuple('BIDSLayout', ['root'])
         wf = init_single_subject_wf(
             anat_only=False,
             aroma_melodic_dim=-200,
+            bids_database_file=None,
             bold2t1w_dof=9,
             cifti_output=False,
+            crashdump_dir='.',
             debug=False,
             dummy_scans=None,
             echo_idx=None,
@@ -346,17 +418,19 @@ def init_single_subject_wf(
             low_mem=False,
             medial_surface_nan=False,
             name='single_subject_wf',
+            nstd_spaces=['T1w', 'fsnative'],
             omp_nthreads=1,
             output_dir='.',
-            output_spaces=OrderedDict([
-                ('MNI152Lin', {}), ('fsaverage', {'density': '10k'}),
-                ('T1w', {}), ('fsnative', {})]),
+            output_spaces={
+                'MNI152Lin': {}, 'fsaverage': {'density': '10k'},
+                'T1w': {}, 'fsnative': {}},
             reportlets_dir='.',
             regressors_all_comps=False,
             regressors_dvars_th=1.5,
             regressors_fd_th=0.5,
             skull_strip_fixed_seed=False,
             skull_strip_template=('OASIS30ANTs', {}),
+            subject_data=None,
             subject_id='test',
             t2s_coreg=False,
             task_id='',
@@ -373,10 +447,17 @@ def init_single_subject_wf(
         aroma_melodic_dim : int
             Maximum number of components identified by MELODIC within ICA-AROMA
             (default is -200, i.e., no limitation).
+        bids_database_file : str or None
+            Path to a SQLite database caching the index of the BIDS dataset,
+            as generated with :meth:`bids.BIDSLayout.save`.
+            If ``None``, the ``layout`` object is queried directly.
         bold2t1w_dof : 6, 9 or 12
             Degrees-of-freedom for BOLD-T1w registration
         cifti_output : bool
             Generate bold CIFTI file in output spaces
+        crashdump_dir : str
+            Directory where nipype should store the crash files of the
+            nodes of this workflow
         debug : bool
             Enable debugging outputs
         dummy_scans : int or None
@@ -409,12 +490,15 @@ def init_single_subject_wf(
             Replace medial wall values with NaNs on functional GIFTI files
         name : str
             Name of workflow
+        nstd_spaces : list
+            Sorted list of the nonstandard references requested in
+            ``output_spaces``
         omp_nthreads : int
             Maximum number of threads an individual process may use
         output_dir : str
             Directory in which to save derivatives
-        output_spaces : OrderedDict
-            Ordered dictionary where keys are TemplateFlow ID strings (e.g., ``MNI152Lin``,
+        output_spaces : dict
+            Dictionary (order matters) where keys are TemplateFlow ID strings (e.g., ``MNI152Lin``,
             ``MNI152NLin6Asym``, ``MNI152NLin2009cAsym``, or ``fsLR``) strings designating
             nonstandard references (e.g., ``T1w`` or ``anat``, ``sbref``, ``run``, etc.),
             or paths pointing to custom templates organized in a TemplateFlow-like structure.
@@ -435,6 +519,10 @@ def init_single_subject_wf(
         skull_strip_template : tuple
             Name of target template for brain extraction with ANTs' ``antsBrainExtraction``,
             and corresponding dictionary of output-space modifiers.
+        subject_data : SubjectData or None
+            Lists of paths of the input files of the subject (``t1w``,
+            ``bold``, etc.), as pre-collected by the parent workflow.
+            If ``None``, the files are collected by querying ``layout``.
         subject_id : str
             List of subject labels
         t2s_coreg : bool
@@ -457,23 +545,51 @@ def init_single_subject_wf(
             FreeSurfer SUBJECTS_DIR
 
     """
-    from ..config import NONSTANDARD_REFERENCES
+    from nipype import __version__ as nipype_ver
+    from nipype.pipeline import engine as pe
+    from nipype.interfaces import utility as niu
+    from niworkflows.engine.workflows import LiterateWorkflow as Workflow
+    from niworkflows.interfaces.bids import BIDSInfo, BIDSDataGrabber
+    from niworkflows.interfaces.nilearn import NILEARN_VERSION
+    from niworkflows.utils.bids import collect_data
+    from niworkflows.utils.misc import fix_multi_T1w_source_name
+    from smriprep.workflows.anatomical import init_anat_preproc_wf
+
+    from ..config import DEFAULT_MEMORY_MIN_GB, NONSTANDARD_REFERENCES
+    from ..interfaces import SubjectSummary, AboutSummary, DerivativesDataSink
+    from .bold import init_func_preproc_wf
+
     if name in ('single_subject_wf', 'single_subject_fmripreptest_wf'):
         # for documentation purposes
-        subject_data = {
-            't1w': ['/completely/made/up/path/sub-01_T1w.nii.gz'],
-            'bold': ['/completely/made/up/path/sub-01_task-nback_bold.nii.gz']
-        }
+        subject_data = SubjectData(
+            fmap=[],
+            bold=['/completely/made/up/path/sub-01_task-nback_bold.nii.gz'],
+            sbref=[], flair=[], t2w=[],
+            t1w=['/completely/made/up/path/sub-01_T1w.nii.gz'],
+            roi=[])
     else:
-        subject_data = collect_data(layout, subject_id, task_id, echo_idx)[0]
+        if bids_database_file is not None:
+            # Reuse the index cached by init_fmriprep_wf instead of
+            # re-traversing the dataset for every subject
+            from bids import BIDSLayout
+            layout = BIDSLayout(layout.root, validate=False,
+                                database_file=bids_database_file,
+                                reset_database=False)
+        if subject_data is None:
+            subject_data = SubjectData(
+                **collect_data(layout, subject_id, task_id, echo_idx)[0])
+
+    # ``BIDSLayout.root`` is guarded by a property in recent pybids -
+    # resolve it once
+    bids_root = layout.root
 
     # Make sure we always go through these two checks
-    if not anat_only and subject_data['bold'] == []:
+    if not anat_only and subject_data.bold == []:
         raise Exception("No BOLD images found for participant {} and task {}. "
                         "All workflows require BOLD images.".format(
                             subject_id, task_id if task_id else '<all>'))
 
-    if not subject_data['t1w']:
+    if not subject_data.t1w:
         raise Exception("No T1w images found for participant {}. "
                         "All workflows require T1w images.".format(subject_id))
 
@@ -510,47 +626,57 @@ It is released under the [CC0]\
 """.format(nilearn_ver=NILEARN_VERSION)
 
     # Filter out standard spaces to a separate dict
-    std_spaces = OrderedDict([
-        (key, modifiers) for key, modifiers in output_spaces.items()
-        if key not in NONSTANDARD_REFERENCES])
+    std_spaces = {key: modifiers for key, modifiers in output_spaces.items()
+                  if key not in NONSTANDARD_REFERENCES}
 
     inputnode = pe.Node(niu.IdentityInterface(fields=['subjects_dir']),
                         name='inputnode')
 
-    bidssrc = pe.Node(BIDSDataGrabber(subject_data=subject_data, anat_only=anat_only),
-                      name='bidssrc')
+    # BIDSDataGrabber expects a plain mapping
+    bidssrc = pe.Node(BIDSDataGrabber(subject_data=subject_data._asdict(),
+                                      anat_only=anat_only),
+                      name='bidssrc', mem_gb=DEFAULT_MEMORY_MIN_GB)
 
     bids_info = pe.Node(BIDSInfo(
-        bids_dir=layout.root, bids_validate=False), name='bids_info')
+        bids_dir=bids_root, bids_validate=False), name='bids_info',
+        mem_gb=DEFAULT_MEMORY_MIN_GB, run_without_submitting=True)
+
+    # Resolve the reference T1w once; the result feeds bids_info and
+    # both report DataSinks
+    t1w_source = pe.Node(
+        niu.Function(function=fix_multi_T1w_source_name, input_names=['in_files'],
+                     output_names=['source_file']),
+        name='t1w_source', mem_gb=DEFAULT_MEMORY_MIN_GB, run_without_submitting=True)
 
     summary = pe.Node(SubjectSummary(
-        std_spaces=list(std_spaces.keys()),
-        nstd_spaces=sorted(set(NONSTANDARD_REFERENCES).intersection(output_spaces.keys()))),
-        name='summary', run_without_submitting=True)
+        std_spaces=list(std_spaces.keys()), nstd_spaces=nstd_spaces),
+        name='summary', mem_gb=DEFAULT_MEMORY_MIN_GB, run_without_submitting=True)
 
     about = pe.Node(AboutSummary(version=__version__,
                                  command=' '.join(sys.argv)),
-                    name='about', run_without_submitting=True)
+                    name='about', mem_gb=DEFAULT_MEMORY_MIN_GB, run_without_submitting=True)
 
     ds_report_summary = pe.Node(
         DerivativesDataSink(base_directory=reportlets_dir,
                             desc='summary', keep_dtype=True),
-        name='ds_report_summary', run_without_submitting=True)
+        name='ds_report_summary', mem_gb=DEFAULT_MEMORY_MIN_GB,
+        run_without_submitting=True)
 
     ds_report_about = pe.Node(
         DerivativesDataSink(base_directory=reportlets_dir,
                             desc='about', keep_dtype=True),
-        name='ds_report_about', run_without_submitting=True)
+        name='ds_report_about', mem_gb=DEFAULT_MEMORY_MIN_GB,
+        run_without_submitting=True)
 
     # Preprocessing of T1w (includes registration to MNI)
     anat_preproc_wf = init_anat_preproc_wf(
-        bids_root=layout.root,
+        bids_root=bids_root,
         debug=debug,
         freesurfer=freesurfer,
         hires=hires,
         longitudinal=longitudinal,
         name="anat_preproc_wf",
-        num_t1w=len(subject_data['t1w']),
+        num_t1w=len(subject_data.t1w),
         omp_nthreads=omp_nthreads,
         output_dir=output_dir,
         output_spaces=std_spaces,
@@ -558,92 +684,124 @@ It is released under the [CC0]\
         skull_strip_fixed_seed=skull_strip_fixed_seed,
         skull_strip_template=skull_strip_template,
     )
+    # The subject identifier is known at build time - setting it here spares
+    # a function evaluation within the graph at run time
+    anat_preproc_wf.inputs.inputnode.subject_id = _prefix(subject_id)
 
     workflow.connect([
         (inputnode, anat_preproc_wf, [('subjects_dir', 'inputnode.subjects_dir')]),
-        (bidssrc, bids_info, [(('t1w', fix_multi_T1w_source_name), 'in_file')]),
+        (bidssrc, t1w_source, [('t1w', 'in_files')]),
+        (t1w_source, bids_info, [('source_file', 'in_file')]),
         (inputnode, summary, [('subjects_dir', 'subjects_dir')]),
         (bidssrc, summary, [('t1w', 't1w'),
                             ('t2w', 't2w'),
                             ('bold', 'bold')]),
         (bids_info, summary, [('subject', 'subject_id')]),
-        (bids_info, anat_preproc_wf, [(('subject', _prefix), 'inputnode.subject_id')]),
         (bidssrc, anat_preproc_wf, [('t1w', 'inputnode.t1w'),
                                     ('t2w', 'inputnode.t2w'),
                                     ('roi', 'inputnode.roi'),
                                     ('flair', 'inputnode.flair')]),
-        (bidssrc, ds_report_summary, [(('t1w', fix_multi_T1w_source_name), 'source_file')]),
+        (t1w_source, ds_report_summary, [('source_file', 'source_file')]),
         (summary, ds_report_summary, [('out_report', 'in_file')]),
-        (bidssrc, ds_report_about, [(('t1w', fix_multi_T1w_source_name), 'source_file')]),
+        (t1w_source, ds_report_about, [('source_file', 'source_file')]),
         (about, ds_report_about, [('out_report', 'in_file')]),
     ])
 
     # Overwrite ``out_path_base`` of smriprep's DataSinks
-    for node in workflow.list_node_names():
-        if node.split('.')[-1].startswith('ds_'):
-            workflow.get_node(node).interface.out_path_base = 'fmriprep'
-
-    if anat_only:
-        return workflow
-
-    for bold_file in subject_data['bold']:
-        func_preproc_wf = init_func_preproc_wf(
-            aroma_melodic_dim=aroma_melodic_dim,
-            bold2t1w_dof=bold2t1w_dof,
-            bold_file=bold_file,
-            cifti_output=cifti_output,
-            debug=debug,
-            dummy_scans=dummy_scans,
-            err_on_aroma_warn=err_on_aroma_warn,
-            fmap_bspline=fmap_bspline,
-            fmap_demean=fmap_demean,
-            force_syn=force_syn,
-            freesurfer=freesurfer,
-            ignore=ignore,
-            layout=layout,
-            low_mem=low_mem,
-            medial_surface_nan=medial_surface_nan,
-            num_bold=len(subject_data['bold']),
-            omp_nthreads=omp_nthreads,
-            output_dir=output_dir,
-            output_spaces=output_spaces,
-            reportlets_dir=reportlets_dir,
-            regressors_all_comps=regressors_all_comps,
-            regressors_fd_th=regressors_fd_th,
-            regressors_dvars_th=regressors_dvars_th,
-            t2s_coreg=t2s_coreg,
-            use_aroma=use_aroma,
-            use_bbr=use_bbr,
-            use_syn=use_syn,
-        )
-
-        workflow.connect([
-            (anat_preproc_wf, func_preproc_wf,
-             [(('outputnode.t1_preproc', _pop), 'inputnode.t1_preproc'),
-              ('outputnode.t1_brain', 'inputnode.t1_brain'),
-              ('outputnode.t1_mask', 'inputnode.t1_mask'),
-              ('outputnode.t1_seg', 'inputnode.t1_seg'),
-              ('outputnode.t1_aseg', 'inputnode.t1_aseg'),
-              ('outputnode.t1_aparc', 'inputnode.t1_aparc'),
-              ('outputnode.t1_tpms', 'inputnode.t1_tpms'),
-              ('outputnode.template', 'inputnode.template'),
-              ('outputnode.forward_transform', 'inputnode.anat2std_xfm'),
-              ('outputnode.reverse_transform', 'inputnode.std2anat_xfm'),
-              ('outputnode.joint_template', 'inputnode.joint_template'),
-              ('outputnode.joint_forward_transform', 'inputnode.joint_anat2std_xfm'),
-              ('outputnode.joint_reverse_transform', 'inputnode.joint_std2anat_xfm'),
-              # Undefined if --no-freesurfer, but this is safe
-              ('outputnode.subjects_dir', 'inputnode.subjects_dir'),
-              ('outputnode.subject_id', 'inputnode.subject_id'),
-              ('outputnode.t1_2_fsnative_forward_transform',
-               'inputnode.t1_2_fsnative_forward_transform'),
-              ('outputnode.t1_2_fsnative_reverse_transform',
-               'inputnode.t1_2_fsnative_reverse_transform')]),
-        ])
+    for node in workflow._get_all_nodes():
+        if node.name.startswith('ds_'):
+            node.interface.out_path_base = 'fmriprep'
+
+    if not anat_only:
+        for bold_file in subject_data.bold:
+            func_preproc_wf = init_func_preproc_wf(
+                aroma_melodic_dim=aroma_melodic_dim,
+                bold2t1w_dof=bold2t1w_dof,
+                bold_file=bold_file,
+                cifti_output=cifti_output,
+                debug=debug,
+                dummy_scans=dummy_scans,
+                err_on_aroma_warn=err_on_aroma_warn,
+                fmap_bspline=fmap_bspline,
+                fmap_demean=fmap_demean,
+                force_syn=force_syn,
+                freesurfer=freesurfer,
+                ignore=ignore,
+                layout=layout,
+                low_mem=low_mem,
+                medial_surface_nan=medial_surface_nan,
+                num_bold=len(subject_data.bold),
+                omp_nthreads=omp_nthreads,
+                output_dir=output_dir,
+                output_spaces=output_spaces,
+                reportlets_dir=reportlets_dir,
+                regressors_all_comps=regressors_all_comps,
+                regressors_fd_th=regressors_fd_th,
+                regressors_dvars_th=regressors_dvars_th,
+                t2s_coreg=t2s_coreg,
+                use_aroma=use_aroma,
+                use_bbr=use_bbr,
+                use_syn=use_syn,
+            )
+
+            workflow.connect([
+                (anat_preproc_wf, func_preproc_wf, list(ANAT_TO_FUNC_CONNECTIONS)),
+            ])
+
+    # Nipype flattens the graph before running and only merges the top-level
+    # workflow config into each node (Workflow.run), so the crash-dump
+    # destination cannot be inherited from this workflow's config and must
+    # be stamped on every node - one shared copy, never mutated afterwards.
+    workflow.config['execution']['crashdump_dir'] = crashdump_dir
+    node_config = deepcopy(workflow.config)
+    for node in workflow._get_all_nodes():
+        node.config = node_config
 
     return workflow
 
 
+def _collect_all_data(layout, subject_list, task_id, echo_idx):
+    """
+    Gather the input files of a list of subjects with a single layout query,
+    replicating the per-subject queries of niworkflows' ``collect_data``.
+    """
+    from niworkflows.utils.bids import group_multiecho
+
+    queries = {
+        'fmap': {'datatype': 'fmap'},
+        'bold': {'datatype': 'func', 'suffix': 'bold'},
+        'sbref': {'datatype': 'func', 'suffix': 'sbref'},
+        'flair': {'datatype': 'anat', 'suffix': 'FLAIR'},
+        't2w': {'datatype': 'anat', 'suffix': 'T2w'},
+        't1w': {'datatype': 'anat', 'suffix': 'T1w'},
+        'roi': {'datatype': 'anat', 'suffix': 'roi'},
+    }
+    if task_id:
+        queries['bold']['task'] = task_id
+    if echo_idx:
+        queries['bold']['echo'] = echo_idx
+
+    subjects_data = {subject_id: {dtype: [] for dtype in queries}
+                     for subject_id in subject_list}
+    for bids_file in layout.get(subject=subject_list,
+                                extension=['nii', 'nii.gz']):
+        entities = bids_file.get_entities(metadata=False)
+        for dtype, query in queries.items():
+            if all(str(entities.get(key)) == str(value)
+                   for key, value in query.items()):
+                subjects_data[entities['subject']][dtype].append(bids_file.path)
+                break
+    for subject_data in subjects_data.values():
+        for files in subject_data.values():
+            files.sort()
+        # Multiplex the echoes of multi-echo series into sublists, as
+        # init_func_preproc_wf dispatches multi-echo handling on them
+        if any('_echo-' in bold for bold in subject_data['bold']):
+            subject_data['bold'] = group_multiecho(subject_data['bold'])
+    return {subject_id: SubjectData(**subject_data)
+            for subject_id, subject_data in subjects_data.items()}
+
+
 def _prefix(subid):
     if subid.startswith('sub-'):
         return subid
@@ -654,3 +812,29 @@ def _pop(inlist):
     if isinstance(inlist, (list, tuple)):
         return inlist[0]
     return inlist
+
+
+# Connections of the anatomical outputs into every BOLD preprocessing
+# workflow - identical for all BOLD series, so declared only once
+ANAT_TO_FUNC_CONNECTIONS = (
+    (('outputnode.t1_preproc', _pop), 'inputnode.t1_preproc'),
+    ('outputnode.t1_brain', 'inputnode.t1_brain'),
+    ('outputnode.t1_mask', 'inputnode.t1_mask'),
+    ('outputnode.t1_seg', 'inputnode.t1_seg'),
+    ('outputnode.t1_aseg', 'inputnode.t1_aseg'),
+    ('outputnode.t1_aparc', 'inputnode.t1_aparc'),
+    ('outputnode.t1_tpms', 'inputnode.t1_tpms'),
+    ('outputnode.template', 'inputnode.template'),
+    ('outputnode.forward_transform', 'inputnode.anat2std_xfm'),
+    ('outputnode.reverse_transform', 'inputnode.std2anat_xfm'),
+    ('outputnode.joint_template', 'inputnode.joint_template'),
+    ('outputnode.joint_forward_transform', 'inputnode.joint_anat2std_xfm'),
+    ('outputnode.joint_reverse_transform', 'inputnode.joint_std2anat_xfm'),
+    # Undefined if --no-freesurfer, but this is safe
+    ('outputnode.subjects_dir', 'inputnode.subjects_dir'),
+    ('outputnode.subject_id', 'inputnode.subject_id'),
+    ('outputnode.t1_2_fsnative_forward_transform',
+     'inputnode.t1_2_fsnative_forward_transform'),
+    ('outputnode.t1_2_fsnative_reverse_transform',
+     'inputnode.t1_2_fsnative_reverse_transform'),
+)
@@ -10,7 +10,6 @@ Orchestrating the BOLD-preprocessing workflow
 """
 
 import os
-from collections import OrderedDict
 
 import nibabel as nb
 from nipype import logging
@@ -91,7 +90,7 @@ def init_func_preproc_wf(
         :simple_form: yes
 
         from fmriprep.workflows.bold import init_func_preproc_wf
-        from collections import namedtuple, OrderedDict
+        from collections import namedtuple
         BIDSLayout = namedtuple('BIDSLayout', ['root'])
         wf = init_func_preproc_wf(
             aroma_melodic_dim=-200,
@@ -110,9 +109,9 @@ def init_func_preproc_wf(
             medial_surface_nan=False,
             omp_nthreads=1,
             output_dir='.',
-            output_spaces=OrderedDict([
-                ('MNI152Lin', {}), ('fsaverage', {'density': '10k'}),
-                ('T1w', {}), ('fsnative', {})]),
+            output_spaces={
+                'MNI152Lin': {}, 'fsaverage': {'density': '10k'},
+                'T1w': {}, 'fsnative': {}},
             regressors_all_comps=False,
             regressors_dvars_th=1.5,
             regressors_fd_th=0.5,
@@ -161,8 +160,8 @@ def init_func_preproc_wf(
             Maximum number of threads an individual process may use
         output_dir : str
             Directory in which to save derivatives
-        output_spaces : OrderedDict
-            Ordered dictionary where keys are TemplateFlow ID strings (e.g. ``MNI152Lin``,
+        output_spaces : dict
+            Dictionary (order matters) where keys are TemplateFlow ID strings (e.g. ``MNI152Lin``,
             ``MNI152NLin6Asym``, ``MNI152NLin2009cAsym``, or ``fsLR``) strings designating
             nonstandard references (e.g. ``T1w`` or ``anat``, ``sbref``, ``run``, etc.),
             or paths pointing to custom templates organized in a TemplateFlow-like structure.
@@ -271,12 +270,10 @@ def init_func_preproc_wf(
     from ..fieldmap.base import init_sdc_wf  # Avoid circular dependency (#1066)
 
     # Filter out standard spaces to a separate dict
-    std_spaces = OrderedDict([
-        (key, modifiers) for key, modifiers in output_spaces.items()
-        if key not in NONSTANDARD_REFERENCES])
-    volume_std_spaces = OrderedDict([
-        (key, modifiers) for key, modifiers in std_spaces.items()
-        if not key.startswith('fs')])
+    std_spaces = {key: modifiers for key, modifiers in output_spaces.items()
+                  if key not in NONSTANDARD_REFERENCES}
+    volume_std_spaces = {key: modifiers for key, modifiers in std_spaces.items()
+                         if not key.startswith('fs')}
 
     ref_file = bold_file
     mem_gb = {'filesize': 1, 'resampled': 1, 'largemem': 1}
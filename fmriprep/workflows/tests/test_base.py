@@ -0,0 +1,54 @@
+''' Testing module for fmriprep.workflows.base '''
+import json
+
+from niworkflows.utils.bids import collect_data
+
+from ..base import _collect_all_data
+
+DATASET_FILES = [
+    'sub-01/anat/sub-01_T1w.nii.gz',
+    'sub-01/func/sub-01_task-rest_bold.nii.gz',
+    'sub-01/func/sub-01_task-nback_echo-1_bold.nii.gz',
+    'sub-01/func/sub-01_task-nback_echo-2_bold.nii.gz',
+    'sub-01/func/sub-01_task-nback_echo-3_bold.nii.gz',
+    'sub-02/anat/sub-02_T1w.nii.gz',
+    'sub-02/anat/sub-02_T2w.nii.gz',
+    'sub-02/fmap/sub-02_phasediff.nii.gz',
+    'sub-02/fmap/sub-02_magnitude1.nii.gz',
+    'sub-02/func/sub-02_task-rest_run-01_bold.nii.gz',
+    'sub-02/func/sub-02_task-rest_run-02_bold.nii.gz',
+]
+
+
+def _make_dataset(root):
+    (root / 'dataset_description.json').write_text(
+        json.dumps({'Name': 'Test dataset', 'BIDSVersion': '1.0.2'}))
+    for relpath in DATASET_FILES:
+        path = root / relpath
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(b'')
+
+
+def test_collect_all_data_matches_collect_data(tmp_path):
+    from bids import BIDSLayout
+    _make_dataset(tmp_path)
+    layout = BIDSLayout(str(tmp_path), validate=False)
+
+    subjects_data = _collect_all_data(layout, ['01', '02'], None, None)
+    for subject_id in ('01', '02'):
+        assert dict(subjects_data[subject_id]._asdict()) == \
+            collect_data(layout, subject_id)[0]
+
+    # The echoes of the multi-echo series must come multiplexed in a sublist
+    assert any(isinstance(series, list) for series in subjects_data['01'].bold)
+
+
+def test_collect_all_data_honors_task_filter(tmp_path):
+    from bids import BIDSLayout
+    _make_dataset(tmp_path)
+    layout = BIDSLayout(str(tmp_path), validate=False)
+
+    subjects_data = _collect_all_data(layout, ['01', '02'], 'rest', None)
+    for subject_id in ('01', '02'):
+        assert dict(subjects_data[subject_id]._asdict()) == \
+            collect_data(layout, subject_id, task='rest')[0]